@@ -44,6 +44,20 @@ re_emoji_smiley_sad = re.compile(u'['
     u'\U0001F61E-\U0001F62D]+?',
     re.UNICODE)
 
+# Combined ascii+emoji alternations so each message is scanned twice (happy,
+# sad) instead of four times
+re_smiley_happy_all = re.compile(re_smiley_happy.pattern + "|" + re_emoji_smiley_happy.pattern, re.UNICODE)
+re_smiley_sad_all = re.compile(re_smiley_sad.pattern + "|" + re_emoji_smiley_sad.pattern, re.UNICODE)
+
+# All smiley patterns fused into one alternation: calc_stats_emoji only
+# counts occurrences and does not need the happy/sad sentiment, so a single
+# scan per message suffices
+re_smiley_all = re.compile(re_smiley_happy_all.pattern + "|" + re_smiley_sad_all.pattern, re.UNICODE)
+
+# Punctuation stripped from words in calc_word_analysis, both characters
+# removed in one scan
+re_punct = re.compile("[!?]")
+
 def load_config(cfgfile):
     """
     Load use alias config so we split main program and chat-specific settings
@@ -91,6 +105,29 @@ def parse_log(chatlog, useraliases=None, parsedlogfile=None, timeframes=(31,), c
     # Publish results
     publish(allstats, outdir, template, "pysg_stats.html")
     
+def read_chat_lines(f):
+    """
+    Yield chat log lines from file object 'f', reading in bulk 8 KiB chunks
+    instead of iterating per line. Whatsapp sometimes inserts \\u200e
+    characters, strip these once per chunk here (cheaper than per line).
+    A partial line at the end of a chunk is carried over to the next one.
+    """
+    leftover = ""
+    while True:
+        chunk = f.read(8192)
+        if not chunk:
+            break
+        chunk = leftover + chunk.replace("\u200e", "")
+        lines = chunk.splitlines(keepends=True)
+        # Last line may continue in the next chunk, keep it as leftover
+        if not lines[-1].endswith("\n"):
+            leftover = lines.pop()
+        else:
+            leftover = ""
+        yield from lines
+    if (leftover):
+        yield leftover
+
 def normalize_whatsapp(chatlog, parsedlogfile=None):
     """
     Given a raw log file from WhatsApp, normalize into parsable chatlog
@@ -107,64 +144,75 @@ def normalize_whatsapp(chatlog, parsedlogfile=None):
     # Pre-compile regexp to check if line is a new message or not.
     # Multi-lines messages span multiple log lines. If a line does 
     # not start with a date, we assume it's part of the previous line
-    # WhatsApp format 2013 and newer:
-    re_checknewline = re.compile("([0-9/]{10}\, [0-9]+:[0-9]+:[0-9]+)")
-    # re_checknewline.search("[03/03/2019, 19:57:26] nick name: Tof")
-    # re_checknewline.search("17/12/2011, 14:45:42: User Name: Test?")
+    # WhatsApp format 2013 and newer. The date is always at the start of the
+    # line (optionally preceded by '['), so anchor the pattern and use
+    # match() below such that continuation lines fail after 1-2 characters
+    # instead of search() scanning the whole line
+    re_checknewline = re.compile(r"\[?(\d{2}/\d{2}/\d{4}, \d{1,2}:\d{2}:\d{2})")
+    # re_checknewline.match("[03/03/2019, 19:57:26] nick name: Tof")
+    # re_checknewline.match("17/12/2011, 14:45:42: User Name: Test?")
 
     # Parse data, concatenate messages when spanning multiple lines.
     chatnormalized = []
     parsedmsg = ""
 
-    # @TODO Fix this ugly code duplication
+    # Cache bound method as local to skip attribute lookups per line
+    checknewline = re_checknewline.match
+
+    with open(chatlog) as f:
+        # Read in bulk chunks. We keep trailing whitespace and port it to
+        # the parsed file
+        for r in read_chat_lines(f):
+            # If line starts with date, it's a new message
+            date_re = checknewline(r)
+            if (date_re):
+                # We found a new message, store previous unles empty
+                if (parsedmsg):
+                    chatnormalized.append(parsedmsg)
+                # Start parsing new message, could be multiple lines. Use
+                # the regexp from above to delineate the date start and
+                # end, as well as the username start
+                parsedmsg = normalize_whatsapp_line(r, dstart=date_re.start(1), dend=date_re.end(1), ustart=date_re.end(1)+2)
+            else:
+                # This line continues the message on the previous line
+                parsedmsg[-1] = parsedmsg[-1].rstrip() + r
+
+    # Write out the normalized log in one writelines() batch instead of a
+    # small write() per message inside the loop. This also drops the old
+    # duplicated write/no-write parse loops
     if (parsedlogfile):
-        with open(chatlog) as f, open(parsedlogfile, 'w') as w:
-            # Read and parse line immediately
-            # https://stackoverflow.com/questions/3277503/how-to-read-a-file-line-by-line-into-a-list
-            for r in f:
-                # We keep trailing whitespace and port it to the parsed file
-                # r.rstrip()
-                # Whatsapp sometimes inserts \u200e characters, strip these here
-                r = r.replace("\u200e","")
-
-                # If line starts with date, it's a new message
-                date_re = re_checknewline.search(r)
-                if (date_re):
-                    # We found a new message, write out previous unles empty
-                    if (parsedmsg): 
-                        w.write(",".join(parsedmsg))
-                        chatnormalized.append(parsedmsg)
-                    # Start parsing new message, could be multiple lines. Use 
-                    # the regexp from above to delineate the date start and 
-                    # end, as well as the username start
-                    parsedmsg = normalize_whatsapp_line(r, dstart=date_re.start(), dend=date_re.end(), ustart=date_re.end()+2)
-                else:
-                    # This line continues the message on the previous line
-                    parsedmsg[-1] = parsedmsg[-1].rstrip() + r
-    else:
-        with open(chatlog) as f:
-            # Read lines only
-            # https://stackoverflow.com/questions/3277503/how-to-read-a-file-line-by-line-into-a-list
-            for r in f:
-                # We keep trailing whitespace and port it to the parsed file
-                # r.rstrip()
-                # Whatsapp sometimes inserts \u200e characters, strip these here
-                r = r.replace("\u200e","")
-
-                # If line starts with date, it's a new message
-                date_re = re_checknewline.search(r)
-                if (date_re):
-                    # We found a new message, write out previous unles empty
-                    if (parsedmsg): 
-                        chatnormalized.append(parsedmsg)
-                    # Start parsing new message, could be multiple lines
-                    parsedmsg = normalize_whatsapp_line(r, dstart=date_re.start(), dend=date_re.end(), ustart=date_re.end()+2)
-                else:
-                    # This line continues the message on the previous line
-                    parsedmsg[-1] = parsedmsg[-1].rstrip() + r
+        with open(parsedlogfile, 'w') as w:
+            w.writelines(",".join(p) for p in chatnormalized)
 
     return chatnormalized
 
+SYSTEM_MARKERS = (
+    # example subject line: 19/05/2023, 11:34:34: Nick Name changed the subject to “🐮🌻🍺#!bla🍺🌻🐮”
+    (" changed the subject to", "subject", "named"),
+    (" created", "create", "named_nocolon"),
+    # Whatsapp <2014
+    (" changed the group icon", "icon", "named"),
+    (" deleted the group icon", "icon", "named"),
+    # example icon line: 27/04/2016, 20:14:33: Nick Extra Name changed this group's icon
+    (" changed this group's icon", "icon", "named"),
+    (" deleted this group's icon", "icon", "named"),
+    (" added", "join", "named_nocolon"),
+    (" joined", "join", "named_nocolon"),
+    (" left", "leave", "named_nocolon"),
+    # example: 23/09/2016, 22:24:16: Nick Extra Name's security code changed.
+    ("'s security code changed", "seccode", "colon"),
+    ("Messages to this group are now secured with end-to-end encryption.", "secured", "colon"),
+    # Media posted without caption, e.g.:
+    # 30/04/2017, 12:29:02: Nick Extra Name: image omitted
+    # NB we strip \u200e above, so no need to check
+    ("image omitted", "image", "media"),
+    ("GIF omitted", "gif", "media"),
+    ("video omitted", "video", "media"),
+    ("audio omitted", "audio", "media"),
+    ("sticker omitted", "sticker", "media"),
+    ("document omitted", "document", "media"),
+)
+
 def normalize_whatsapp_line(r, dstart=1, dend=21, ustart=23):
     """
     Parse single whatsapp line into normalized log file. Expects clean string,
@@ -173,127 +221,44 @@ def normalize_whatsapp_line(r, dstart=1, dend=21, ustart=23):
     dstart: date string start
     dend: date string end
     ustart: username start
+
+    System lines are recognized via the SYSTEM_MARKERS (needle, mtype,
+    style) table, scanned once over the part of the line after the
+    username start. Styles: 'named' takes the username up to the marker and
+    the message from the marker (skipping its leading space),
+    'named_nocolon' is the same but only matches when the line has no colon
+    after the username start, 'colon' takes the username up to the first
+    colon and the message from the marker, 'media' takes the username up to
+    the first colon and the message after it (like a regular message).
     """
 
-    if (r.find(" changed the subject to")>dend):
-        # Line is new topic
-        # example subject line: 19/05/2023, 11:34:34: Nick Name changed the subject to “🐮🌻🍺#!bla🍺🌻🐮”
-        mtype = "subject"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(" changed the subject to",ustart)]
-        msgstr = r[r.find("changed the subject to",dend):]
-    elif (r.find(" created")>dend and r.find(":",ustart) == -1):
-        # Line is created message, no colon found
-        # example icon line: 
-        mtype = "create"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(" created",ustart)]
-        msgstr = r[r.find("created",dend):]
-    # Whatsapp <2014
-    elif (r.find(" changed the group icon")>dend):
-        mtype = "icon"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(" changed the group icon",ustart)]
-        msgstr = r[r.find("changed the group icon",dend):]
-    elif (r.find(" deleted the group icon")>dend):
-        mtype = "icon"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(" deleted the group icon",ustart)]
-        msgstr = r[r.find("deleted the group icon",dend):]
-
-    elif (r.find(" changed this group's icon")>dend):
-        # Line is new topic
-        # example icon line: 27/04/2016, 20:14:33: Nick Extra Name changed this group's icon
-        mtype = "icon"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(" changed this group's icon",ustart)]
-        msgstr = r[r.find("changed this group's icon",dend):]
-    elif (r.find(" deleted this group's icon")>dend):
-        # Line is new topic
-        # example icon line: 27/04/2016, 20:14:33: Nick Extra Name deleted this group's icon
-        mtype = "icon"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(" deleted this group's icon",ustart)]
-        msgstr = r[r.find("deleted this group's icon",dend):]
-    elif (r.find(" added")>dend and r.find(":",ustart) == -1):
-        # Line is add message, no colon found
-        # example icon line: 
-        mtype = "join"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(" added",ustart)]
-        msgstr = r[r.find("added",dend):]
-    elif (r.find(" joined")>dend and r.find(":",ustart) == -1):
-        # Line is leave message, no colon found
-        # example icon line: 
-        mtype = "join"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(" joined",ustart)]
-        msgstr = r[r.find("joined",dend):]
-    elif (r.find(" left")>dend and r.find(":",ustart) == -1):
-        # Line is leave message, no colon found
-        # example icon line: 
-        mtype = "leave"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(" left",ustart)]
-        msgstr = r[r.find("left",dend):]
-    elif (r.find("'s security code changed")>dend):
-        # Security code changed
-        # example: 23/09/2016, 22:24:16: Nick Extra Name's security code changed.
-        mtype = "seccode"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(":",ustart)]
-        msgstr = r[r.find("'s security code changed",dend):]
-    elif (r.find("Messages to this group are now secured with end-to-end encryption.")>dend):
-        mtype = "secured"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(":",ustart)]
-        msgstr = r[r.find("Messages to this group are now secured with end-to-end encryption.",dend):]
-    elif (r.find("image omitted")>dend):
-        # Image posted - without caption
-        # example: 30/04/2017, 12:29:02: Nick Extra Name: image omitted
-        # NB we strip \u200e above, so no need to check
-        mtype = "image"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(":",ustart)]
-        msgstr = r[r.find(":",ustart)+2:]
-    elif (r.find("GIF omitted")>dend):
-        # GIF posted - without caption
-        mtype = "gif"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(":",ustart)]
-        msgstr = r[r.find(":",ustart)+2:]
-    elif (r.find("video omitted")>dend):
-        # GIF posted - without caption
-        mtype = "video"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(":",ustart)]
-        msgstr = r[r.find(":",ustart)+2:]
-    elif (r.find("audio omitted")>dend):
-        # GIF posted - without caption
-        mtype = "audio"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(":",ustart)]
-        msgstr = r[r.find(":",ustart)+2:]
-    elif (r.find("sticker omitted")>dend):
-        # GIF posted - without caption
-        mtype = "sticker"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(":",ustart)]
-        msgstr = r[r.find(":",ustart)+2:]
-    elif (r.find("document omitted")>dend):
-        # GIF posted - without caption
-        mtype = "document"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(":",ustart)]
-        msgstr = r[r.find(":",ustart)+2:]
-    else:
-        # Line contains regular message
-        # split lines by date [dstart:dend], then until the next colon, then until the end
-        # example line:         27/11/2019, 21:40:56: Nick Extra Name: Zo, even whatsapp geleegd\n
-        mtype = "message"
-        datestr = r[dstart:dend]
-        userstr = r[ustart:r.find(":",ustart)]
-        msgstr = r[r.find(":",ustart)+2:]
+    datestr = r[dstart:dend]
+    # Scan only the substring after the username start, once per marker,
+    # instead of running up to 18 full-line find() calls per line
+    tail = r[ustart:]
+    colonpos = tail.find(":")
+
+    # Default: line contains regular message
+    # example line:         27/11/2019, 21:40:56: Nick Extra Name: Zo, even whatsapp geleegd\n
+    mtype = "message"
+    userstr = tail[:colonpos]
+    msgstr = tail[colonpos+2:]
+
+    for needle, ntype, style in SYSTEM_MARKERS:
+        if (style == "named_nocolon" and colonpos != -1):
+            continue
+        pos = tail.find(needle)
+        if (pos == -1):
+            continue
+        mtype = ntype
+        if (style == "colon"):
+            msgstr = tail[pos:]
+        elif (style != "media"):
+            # 'named' and 'named_nocolon': username runs up to the marker,
+            # message starts at the marker without its leading space
+            userstr = tail[:pos]
+            msgstr = tail[pos+1:]
+        break
 
     # Userstr can contain unicode stuff (u202a, u202c, xa0 xa0) if it's a 
     # phone number, filter that out
@@ -308,31 +273,34 @@ def mk_dataframe(chatparsed):
     # We use exact date matching instead of to_datetime() to speed up processing
     # 15/05/2016, 21:55:11
     logging.debug("Parsing dates...")
-    # dfchat['date'] = dfchat.apply(lambda row: pd.to_datetime(row['date'], format="%d/%m/%Y, %H:%M:%S", exact=True, cache=True), axis=1)
-    # datetime(year, month, day[, hour[, minute[, second[, microsecond[,tzinfo]]]]])
-
-    # Time can be 1:12:12 or 12:12:12, so be clever
-    dfchat['date'] = dfchat.apply(lambda v: datetime.datetime(
-        int(v['date'][6:10]), # Year
-        int(v['date'][3:5]), # Month
-        int(v['date'][0:2]), # Day
-        int(v['date'][12:-6]), # H -- can be 1 or 2 digits, but always starts at letter 12 and ends -6
-        int(v['date'][-5:-3]), # M 
-        int(v['date'][-2:])), # S
-        axis=1)
+
+    # Time can be 1:12:12 or 12:12:12, so zero-pad 1-digit hours first such
+    # that we can parse the whole column in one vectorized to_datetime() call
+    # instead of constructing datetime.datetime() per row in Python
+    re_padhour = re.compile(r', (\d):')
+    dfchat['date'] = pd.to_datetime(
+        dfchat['date'].str.replace(re_padhour, r', 0\1:', regex=True),
+        format="%d/%m/%Y, %H:%M:%S", cache=True)
 
     dfchat.set_index('date', inplace=True)
     logging.debug("parsing dates complete...")
 
-    # Calculate number of words per message, smileys, caps, etc.
-    # https://stackoverflow.com/questions/26568722/remove-unicode-emoji-using-re-in-python#26568779
-    re_emoji = re.compile(u'['
-        u'\U0001F300-\U0001F64F'
-        u'\U0001F680-\U0001F6FF'
-        u'\u2600-\u26FF\u2700-\u27BF]+', 
-        re.UNICODE)
-    
-    dfchat['words'] = dfchat.apply(lambda row: len(row["content"].split()), axis=1)
+    # Calculate number of words per message. Use vectorized string methods
+    # instead of a per-row apply(), and int32 since word counts are small
+    dfchat['words'] = dfchat['content'].str.split().str.len().astype(np.int32)
+
+    # Users and message types are low-cardinality, store as category such
+    # that groupbys and comparisons run on integer codes instead of
+    # rehashing strings. NB: groupbys on these columns should pass
+    # observed=True to skip categories absent from a timeframe slice
+    dfchat['user'] = dfchat['user'].astype('category')
+    dfchat['mtype'] = dfchat['mtype'].astype('category')
+
+    # Cache the hour of day and the 6h day-quadrant as int8 columns:
+    # several statistics functions need these and index.hour materializes a
+    # fresh int64 array every access
+    dfchat['_hour'] = dfchat.index.hour.to_numpy().astype(np.int8)
+    dfchat['_quadrant'] = dfchat['_hour'] // 6
 
     return dfchat
 
@@ -352,13 +320,13 @@ def dedup_usernames(chatparsed, useraliases):
         for a in aliases:
             userdict[a] = primname
 
-    # For each name, lookup primary name
-    for i, row in enumerate(chatparsed):
-        # Look up name in dict, if doesn't exist, return name itself
-        # (i.e. don't change) as fallback
-        primname = userdict.get(row[1], row[1])
-        # Update name inplace
-        chatparsed[i][1] = primname
+    # For each name, lookup primary name. Look up name in dict, if doesn't
+    # exist, return name itself (i.e. don't change) as fallback. Mutate the
+    # row through its reference and bind get() as local, skipping the
+    # enumerate() and list-indexing overhead per message
+    get = userdict.get
+    for row in chatparsed:
+        row[1] = get(row[1], row[1])
 
 def calc_stats_emoji(dfchat):
     """
@@ -383,13 +351,14 @@ def calc_stats_emoji(dfchat):
     emoji_user = {}
 
     # Messages per user, used to normalize emoji counts
-    msg_per_user = dfchat.groupby('user').count()['content']
+    msg_per_user = dfchat.groupby('user', observed=True).count()['content']
+
+    # Bind findall as local to skip per-message attribute lookups
+    findall_smiley = re_smiley_all.findall
 
     # Loop over all messages and users, search for emoji, count and store
     for msgstr, userstr in zip(dfchat['content'], dfchat['user']):
-        r_hap = re_smiley_happy.findall(msgstr) + re_emoji_smiley_happy.findall(msgstr)
-        r_sad = re_smiley_sad.findall(msgstr) + re_emoji_smiley_sad.findall(msgstr)
-        r_emoji = r_hap + r_sad
+        r_emoji = findall_smiley(msgstr)
 
         for e in r_emoji:
             emoji_all[e] += 1
@@ -418,28 +387,37 @@ def calc_monologues(dfchat):
     monologues = defaultdict(dict)
     randmonologues = defaultdict(list)
 
-    lastuser = None
-    monocounter = 0
+    # Detect runs of consecutive messages by the same user numerically on
+    # the integer category codes: a few vectorized NumPy ops instead of a
+    # Python loop over every message. Python only touches the few runs
+    # that are long enough to count as monologue
+    codes = dfchat['user'].cat.codes.to_numpy()
+    if (len(codes) == 0):
+        return monologues
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    lengths = np.diff(np.r_[starts, len(codes)])
+
+    # Need more than MONOLOGUE_THRESHOLD messages after the first one of a
+    # run. NB the last run is still open-ended at the end of the log, skip
+    keep = (lengths > MONOLOGUE_THRESHOLD + 1)
+    keep[-1] = False
+
+    users = dfchat['user'].to_numpy()
+    contents = dfchat['content'].to_numpy()
+    for start, length in zip(starts[keep].tolist(), lengths[keep].tolist()):
+        user = users[start]
+        thismonologue = contents[start:start+length].tolist()
+        # Same comparison as the old per-message loop, which counted the
+        # repeats excluding the first message of a run
+        if (length - 1 > monologues[user].get('longest',{'length':0})['length']):
+            monologues[user]['longest'] = {
+                'length': length,
+                'message': thismonologue
+            }
+        monologues[user]['count'] = monologues[user].get('count', 0) + 1
+        randmonologues[user].append(thismonologue)
 
-    # The code below is 1000x faster than this: for i, m in dfchat.iterrows(): msgstr = m['content']
-    for msgstr, userstr in zip(dfchat['content'], dfchat['user']):
-        if userstr == lastuser:
-            monocounter += 1
-            thismonologue.append(msgstr)
-        else:
-            if (monocounter > MONOLOGUE_THRESHOLD):
-                if (monocounter > monologues[lastuser].get('longest',{'length':0})['length']):
-                    monologues[lastuser]['longest'] = {
-                        'length': len(thismonologue),
-                        'message': thismonologue
-                    }
-                monologues[lastuser]['count'] = monologues[lastuser].get('count', 0) + 1
-                randmonologues[lastuser].append(thismonologue)
-
-            monocounter = 0
-            thismonologue = [msgstr]
-        lastuser = userstr
-    
     # Select random monologues
     for user in monologues.keys():
         monologues[user]['random'] = random.choice(randmonologues[user])
@@ -476,18 +454,24 @@ def calc_mostactive(dfchat):
             dfchatsub = dfchat
             dictkey = hr
         else:
-            msk = (dfchat.index.hour >= hr) & (dfchat.index.hour <  (hr+6))
+            # Single == compare on the cached quadrant column instead of
+            # two hour comparisons plus an AND
+            msk = (dfchat['_quadrant'] == hr // 6)
             dfchatsub = dfchat[msk]
             dictkey = "{:02d}:00".format(hr)
         
-        # Get: random quote, count of messages (using len), average words per
-        # message. We hijack the 'mtype' column here to compute the message count
-        # so we don't need a multi-index thing (see above)
-        activenick = dfchatsub.groupby('user', sort=False).agg(
-            {'content': lambda x: x[np.random.randint(len(x))],
-            'mtype': len,
-            'words': lambda x: round(np.average(x),2) }
+        # Get: random quote, count of messages, average words per message.
+        # Shuffle once so taking 'first' per group yields a random quote,
+        # which keeps the whole agg on fast built-in aggregations instead of
+        # a Python lambda per group. We hijack the 'mtype' column here to
+        # compute the message count so we don't need a multi-index thing
+        # (see above)
+        activenick = dfchatsub.sample(frac=1).groupby('user', sort=False, observed=True).agg(
+            {'content': 'first',
+            'mtype': 'size',
+            'words': 'mean'}
             ).sort_values('mtype', ascending=False)
+        activenick['words'] = activenick['words'].round(2)
 
         # Rename columns to understand meaning
         # https://stackoverflow.com/questions/11346283/renaming-columns-in-pandas/46912050#46912050
@@ -565,23 +549,23 @@ def calc_alltime_stats(dfchatsub):
 
     dfdate = pd.date_range(mindate, dfcont.index.max().date(), freq=tfreq)
 
-    # Count messages for 4 quadrants of the day. reindex to force same date range, fillna() for missing days
-    msg0 = dfcont[(dfcont.index.hour >= 0) & (dfcont.index.hour < 6)].resample(tfreq).count().reindex(dfdate).fillna(0)
-    msg6 = dfcont[(dfcont.index.hour >= 6) & (dfcont.index.hour < 12)].resample(tfreq).count().reindex(dfdate).fillna(0)
-    msg12 = dfcont[(dfcont.index.hour >= 12) & (dfcont.index.hour < 18)].resample(tfreq).count().reindex(dfdate).fillna(0)
-    msg18 = dfcont[(dfcont.index.hour >= 18) & (dfcont.index.hour < 24)].resample(tfreq).count().reindex(dfdate).fillna(0)
-
-    # Convert to python datatypes, we don't need numpy here. Also convert 
-    # dates to days and drop midnight timestamp
-    alltime = {}
-    for d, msgs in zip(dfdate, zip(msg0.values, msg6.values, msg12.values, msg18.values)):
-        alltime[str(d.date())] = {
-            '00:00': int(msgs[0]),
-            '06:00': int(msgs[1]),
-            '12:00': int(msgs[2]),
-            '18:00': int(msgs[3]),
-            'all': int(sum(msgs))
-        }
+    # Count messages for 4 quadrants of the day in one pass: group by
+    # (date bin, quadrant of day) and pivot the quadrant out as columns,
+    # instead of four masked resample() scans over the full index.
+    # reindex to force same date range and all 4 quadrants, 0 for missing
+    quadrant = dfchatsub['_quadrant']
+    msgcounts = dfcont.groupby([pd.Grouper(freq=tfreq), quadrant]).size()
+    msgcounts = msgcounts.unstack(fill_value=0).reindex(
+        index=dfdate, fill_value=0).reindex(columns=np.arange(4), fill_value=0)
+
+    # Convert to python datatypes with a single to_dict() instead of
+    # building the nested dict row by row. int32 is plenty for the counts.
+    # Also convert dates to days and drop midnight timestamp
+    msgcounts = msgcounts.astype(np.int32)
+    msgcounts.columns = ('00:00', '06:00', '12:00', '18:00')
+    msgcounts['all'] = msgcounts.sum(axis=1)
+    msgcounts.index = dfdate.strftime('%Y-%m-%d')
+    alltime = msgcounts.to_dict(orient='index')
 
     return alltime
 
@@ -591,10 +575,12 @@ def calc_daily_stats(dfchatsub):
     """
 
     # relative messages and # words per hour of day, in percentage
-    dfdaily_contents = dfchatsub['content'].groupby(lambda x: x.hour).count()
-    dfdaily_words = dfchatsub['words'].groupby(lambda x: x.hour).sum()
+    # Group on the cached int8 hour column instead of calling a Python
+    # lambda on the index for every row (and for every aggregate)
+    dfdaily_contents = dfchatsub.groupby('_hour')['content'].count()
+    dfdaily_words = dfchatsub.groupby('_hour')['words'].sum()
     # words per message (or line) per hour of day
-    dfdaily_wordsperline = dfchatsub['words'].groupby(lambda x: x.hour).sum() / dfchatsub['content'].groupby(lambda x: x.hour).count()
+    dfdaily_wordsperline = dfdaily_words / dfdaily_contents
 
     # Force display of each hour, also if no data (use 0) -- not sure why I made this int64
     hridx = np.arange(24, dtype=np.int64)
@@ -638,18 +624,25 @@ def calc_total_stats(dfchat):
         'newestmsg': dfchat['content'][-1],
         'duration': int((dfchat.index.max() - dfchat.index.min()).days)
     }
+    # Count all message types at once instead of one full column compare
+    # plus sum() per type
+    mtype_counts = dfchat['mtype'].value_counts()
+
     totals['words'] = int(dfchat['words'].sum())
-    totals['images'] = int(sum(dfchat['mtype']=='image'))
-    totals['messages'] = int(sum(dfchat['mtype']=='message'))
-    totals['icons'] = int(sum(dfchat['mtype']=='icon'))
+    totals['images'] = int(mtype_counts.get('image', 0))
+    totals['messages'] = int(mtype_counts.get('message', 0))
+    totals['icons'] = int(mtype_counts.get('icon', 0))
     totals['users'] = {
         'count': int(len(dfchat['user'].unique())),
         'names': dfchat['user'].unique().tolist()
         }
+    # First message with the maximum word count, found positionally so we
+    # don't scan and slice the words column twice
+    imaxwords = int(np.argmax(dfchat['words'].to_numpy()))
     totals['maxwords'] = {
-        'count': int(dfchat['words'].max()), 
-        'user': dfchat[dfchat['words'] == dfchat['words'].max()]['user'][0],
-        'message': dfchat[dfchat['words'] == dfchat['words'].max()]['content'][0]
+        'count': int(dfchat['words'].iat[imaxwords]),
+        'user': dfchat['user'].iat[imaxwords],
+        'message': dfchat['content'].iat[imaxwords]
     }
 
     return totals
@@ -671,65 +664,46 @@ def calc_word_analysis(dfchat):
 
     num_words = 15
 
-    # Split all messages and make lowercase for easier comparison. 
-    # Convert to series so we can use value_counts() later on
+    # Split all messages and make lowercase for easier comparison
     dfchat_msg = dfchat[dfchat['mtype'] == 'message']
-
-    # This code calculates all words, not per user:
-
-    # # dfwords = pd.Series(' '.join(dfchat_msg['content']).lower().split())
-    # # TODO Issue: this also breaks links / URLs bc . is removed
-    # dfwords = pd.Series(' '.join(dfchat_msg['content']).replace("!","").replace("?","").lower().split())
-
-    # # https://stackoverflow.com/questions/3939361/remove-specific-characters-from-a-string-in-python
-    # # %timeit w=' '.join(dfchat_msg['content']).lower().split() - 0.5ms -- reference time, the rest of the code should be fast compared to this existing code
-    # # %timeit w.translate({ord(i):None for i in '!?.,'}) - 2.7ms
-    # # %timeit w.replace("!","").replace("?","").replace(",","").replace(".","") - 0.15ms
-    # # %timeit "".join(list(filter(lambda ch: ch not in " ?!.,", w))) - 5ms
-
+    users = dfchat_msg['user']
+    contents = dfchat_msg['content']
+
+    # Relative # of caps messages, as single vectorized pass over the whole
+    # column instead of re-slicing the dataframe per user
+    caps_u = contents.str.isupper().groupby(users, observed=True).mean() * 100.0
+    caps_u_out = {u: round(float(v), 3) for u, v in caps_u.items()}
+
+    # Count ! and ? per user with vectorized str.count. Normalize by the
+    # per-user character count without the ! and ? characters themselves;
+    # the (count - 1) term accounts for the spaces the old per-user
+    # ' '.join() inserted between messages
+    shout_u = contents.str.count('!').groupby(users, observed=True).sum()
+    ask_u = contents.str.count(r'\?').groupby(users, observed=True).sum()
+    nchars_u = contents.str.len().groupby(users, observed=True).sum() + users.groupby(users, observed=True).size() - 1 - shout_u - ask_u
+    shout_u_out = {u: float(v) / round(float(nchars_u[u]) / 100.0, 3) for u, v in shout_u.items()}
+    ask_u_out = {u: float(v) / round(float(nchars_u[u]) / 100.0, 3) for u, v in ask_u.items()}
+
+    # Top long words per user: remove (some) punctuation from the already
+    # lowercased column, explode to one word per row, then a single
+    # (user, word) groupby instead of a value_counts() per user
+    # TODO Issue: this also breaks links / URLs bc ? is removed
+    dfwords = pd.DataFrame({
+        'user': users,
+        'word': dfchat_msg['content_lc'].str.replace(re_punct, '', regex=True).str.split()
+        }).explode('word')
+    dfwords = dfwords[dfwords['word'].str.len() > LONGWORD_THRESHOLD]
+    wordcounts = dfwords.groupby(['user', 'word'], observed=True).size()
+
+    # Keep top-X words per user, sorted by count
+    wordcounts = wordcounts.sort_values(ascending=False).groupby('user').head(num_words)
+
+    # Make dict of words and users, i.e. 'word': {'user1': count1, 'userN': countN}
+    # Note that not all users are included in all words. int() to get
+    # ints that work in JSON
     longmost_u_out = defaultdict(dict)
-    shout_u_out = {}
-    ask_u_out = {}
-    caps_u_out = {}
-
-    for u in dfchat_msg['user'].unique():
-        # Get list of words for this user, remove (some) punctuation
-        dfchat_msg_u = dfchat_msg[(dfchat_msg['user'] == u)]
-
-        # Relative # of caps messages
-        caps_u_out[u] = round(sum(1 for x in dfchat_msg_u['content'] if x.isupper()) * 100.0 / len(dfchat_msg_u),3)
-
-        # We need this operation in the end:
-        #   dfwords_u = pd.Series(' '.join(dfchat_msg_u['content']).replace("!","").replace("?","").lower().split())
-        # but by sequencing it we can get ? and ! counts per user
-        dfwords_u = ' '.join(dfchat_msg_u['content'])
-        shout_u_out[u] = len(dfwords_u)
-        dfwords_u = dfwords_u.replace("!","")
-        shout_u_out[u] -= len(dfwords_u)
-
-        ask_u_out[u] = len(dfwords_u)
-        dfwords_u = dfwords_u.replace("?","")
-        ask_u_out[u] -= len(dfwords_u)
-
-        # Normalize
-        ask_u_out[u] /= round(float(len(dfwords_u))/100.0,3)
-        shout_u_out[u] /= round(float(len(dfwords_u))/100.0,3)
-
-        # for date, l in dfchat.iterrows():
-        #     print(l['content'])
-        #     len(list(filter(str.isupper, l)))
-        #     break
-
-        dfwords_u = pd.Series(dfwords_u.lower().split())
-
-        # Count long words, sort, limit to top-X
-        longmost_u = dfwords_u[dfwords_u.str.len() > LONGWORD_THRESHOLD].value_counts(sort=True)[:num_words]
-
-        # Make dict of words and users, i.e. 'word': {'user1': count1, 'userN': countN}
-        # Note that not all users are included in all words. tolist() to get 
-        # ints that work in JSON
-        for w, c in zip(longmost_u.index, longmost_u.values.tolist()):
-            longmost_u_out[w][u] = c
+    for (u, w), c in wordcounts.items():
+        longmost_u_out[w][u] = int(c)
 
     return caps_u_out, shout_u_out, ask_u_out, longmost_u_out
 
@@ -751,45 +725,55 @@ def calc_timing(dfchat):
     """
 
     timing_hist_users = []
-    timing_hist_bins = None
     timing_hist_counts = []
 
+    # Chat timing in seconds, from 0 to 60 in 30 fixed 2s-wide bins
+    timing_hist_bins = (np.arange(30) * 2.0).tolist()
+
+    # Work on the raw int64 ns timestamps and integer user codes: gaps via
+    # np.diff and user selection via a boolean mask on the codes array,
+    # instead of materializing a TimedeltaIndex and sub-DataFrame per user
+    ns = dfchat.index.asi8
+    user_codes = dfchat['user'].cat.codes.to_numpy()
+    categories = dfchat['user'].cat.categories
+
+    # Histogram all users in one pass: stable-sort by user (the index is
+    # already time-sorted, so each user's messages stay in order), take gaps
+    # between consecutive rows and drop the gap spanning two users' segments,
+    # then quantize into the fixed bins and scatter-add into one
+    # (user, bin) matrix. Gap of exactly 60s goes into the last bin, like
+    # np.histogram's closed right edge
+    order = np.argsort(user_codes, kind='stable')
+    codes_srt = user_codes[order]
+    gaps = np.diff(ns[order]) / 1e9
+    inrange = (codes_srt[1:] == codes_srt[:-1]) & (gaps >= 0) & (gaps <= 60)
+    binidx = np.minimum((gaps[inrange] * 0.5).astype(np.int32), 29)
+    hist_per_user = np.zeros((len(categories), 30), dtype=np.int64)
+    np.add.at(hist_per_user, (codes_srt[1:][inrange], binidx), 1)
+    msgs_per_user = np.bincount(user_codes, minlength=len(categories))
+
     for u in ['Everyone'] + dfchat['user'].unique().tolist():
         if (u == 'Everyone'):
-            dfchat_sub = dfchat
+            # Gaps between all messages regardless of user
+            timing = np.diff(ns) / 1e9
+            inrange = timing[(timing >= 0) & (timing <= 60)]
+            hist = np.bincount(np.minimum((inrange * 0.5).astype(np.int32), 29), minlength=30)
         else:
-            dfchat_sub = dfchat[dfchat['user'] == u]
+            code = categories.get_loc(u)
             # Only calculate if we have more than 100 messages for this user
-            if len(dfchat_sub) < 100:
+            if msgs_per_user[code] < 100:
                 continue
-        
-        timing_hist_users.append(u)
-
-        # Calculate gaps between times
-        timing = (dfchat_sub.index[1:] - dfchat_sub.index[:-1]).total_seconds()
+            hist = hist_per_user[code]
 
-        # Get 99%-max value:
-        # timing_99max = np.percentile(timing, 99)
-        # Use fixed max timing instead to ensure same bins across users
-        timing_99max = 48*3600
-
-        # Chat timing in seconds, from 0 to 60. Optionally use density=True, 
-        # but this fails work when no data is present
-        timing_hist_chat = np.histogram(timing, bins=30, range=(0, 60))
-        # Only story bins the first time, should not be necessary as they're all equal
-        if (u == 'Everyone'):
-            timing_hist_bins = timing_hist_chat[1][:-1].tolist()
-        timing_hist_counts.append(timing_hist_chat[0]*100)
-
-        # Nochat timing in minutes, from 1 min to 99% value
-        # timing_hist_nochat = np.histogram(timing/60., bins=30, range=(1, 1+timing_99max/60.))
+        timing_hist_users.append(u)
+        timing_hist_counts.append(hist * 100)
     
-    # Construct dict here, with layout as specified above
-    chat_timing = {}
-    for bin_i, bin_val in enumerate(timing_hist_bins):
-        chat_timing[bin_val] = {}
-        for u, c in zip(timing_hist_users, timing_hist_counts):
-            chat_timing[bin_val][u] = round(float(c[bin_i]),3)
+    # Construct dict here, with layout as specified above. Transposing one
+    # (bins, users) frame and exporting gives the nested dict in one go
+    # instead of a Python loop per cell
+    hist_arr = np.asarray(timing_hist_counts, dtype=np.float64).T
+    chat_timing = pd.DataFrame(hist_arr, index=timing_hist_bins,
+        columns=timing_hist_users).round(3).to_dict(orient='index')
 
     return {'chat': chat_timing}
 
@@ -814,23 +798,36 @@ def calc_network(dfchat, useraliases):
     mentioned_network = defaultdict(dict)
     mentioned_total = {}
 
-    aliasdict = useraliases    
-    # For each user (object), count how many times they are mentioned by others (subject)
+    aliasdict = useraliases
+
+    users_arr = dfchat['user'].to_numpy()
+
+    # Build one alternation over every alias of every user (object), so each
+    # message is scanned exactly once for all users instead of once per
+    # object. Longest alias first so the most specific alias wins when one
+    # alias contains another
+    alias_user = {}
     for u_object in dfchat['user'].unique():
-        # Loop over aliases for object to get all aliases for object
-        aliases_object = aliasdict.get(u_object, []) + [u_object]
-
-        # For each alias of this user (object)
-        for alias_object in aliases_object:
-            # Count by whom (subject) this alias (object) is mentioned
-            mask_mentioned = dfchat['content'].str.lower().str.contains(alias_object.lower(), regex=False)
-            counts_per_subject = dfchat['user'][mask_mentioned].value_counts()
-            
-            # Store subjects who mentioned this alias
-            for u_subject, count in counts_per_subject.iteritems():
-                mentioned_network[u_subject][u_object] = mentioned_network[u_subject].get(u_object, 0) + count
-            # Store total mentions for this object
-            mentioned_total[u_object] = mentioned_total.get(u_object, 0) + int(counts_per_subject.sum())
+        mentioned_total[u_object] = 0
+        for alias in aliasdict.get(u_object, []) + [u_object]:
+            alias_user[alias.lower()] = u_object
+    aliases_all = sorted(alias_user, key=len, reverse=True)
+    re_aliases = re.compile("|".join(re.escape(a) for a in aliases_all))
+
+    # Find the distinct aliases per message in one findall pass over the
+    # column, then aggregate all (subject, object) pairs with a single
+    # groupby instead of updating dicts per message
+    hits = dfchat['content_lc'].str.findall(re_aliases).map(set)
+    dfhits = pd.DataFrame({'subject': users_arr, 'object': hits.to_numpy()}).explode('object')
+    dfhits['object'] = dfhits['object'].map(alias_user)
+    for (u_subject, u_object), count in dfhits.groupby(['subject', 'object']).size().items():
+        mentioned_network[u_subject][u_object] = int(count)
+
+    # Derive totals per object from the finished network; users that are
+    # never mentioned keep the zero entry set above
+    for counts in mentioned_network.values():
+        for u_object, count in counts.items():
+            mentioned_total[u_object] += count
 
     # mentioned_total_srt = sorted(mentioned_total.items(), key=lambda x: x[1], reverse=True)
     
@@ -862,18 +859,24 @@ def calc_lonely(dfchat):
         user2: count
         ...
     """
-    # Calculate timing between messages (only)
+    # Calculate timing between messages (only), straight from the int64
+    # nanosecond timestamps instead of building a TimedeltaIndex
     dfchat_sub = dfchat[dfchat['mtype'] == 'message']
-    timing = (dfchat_sub.index[1:] - dfchat_sub.index[:-1]).total_seconds()
+    timing = np.diff(dfchat_sub.index.asi8) / 1e9
 
     # Calculate loneliest messages, i.e. ones that have the longest silence 
     # before *and* after them. We take the minimum of the silence before and 
     # after each message as metric. Summing them would incorrectly judge the 
     # last message of a conversation as 'lonely'
-    message_gap = np.vstack([timing[:-1], timing[1:]]).min(axis=0)
+    message_gap = np.minimum(timing[:-1], timing[1:])
 
-    # Sort and find top 20 loneliest messages (= maximum gap)
-    lonely_msg_idx = message_gap.argsort()[-20:][::-1]
+    # Select and find top 20 loneliest messages (= maximum gap). argpartition
+    # finds the top 20 in O(N), after which we only sort those
+    if (len(message_gap) > 20):
+        lonely_msg_idx = np.argpartition(message_gap, -20)[-20:]
+        lonely_msg_idx = lonely_msg_idx[message_gap[lonely_msg_idx].argsort()][::-1]
+    else:
+        lonely_msg_idx = message_gap.argsort()[::-1]
 
     # Story in dict
     lonely = {}
@@ -885,21 +888,16 @@ def calc_lonely(dfchat):
             'gapafter': round(timing[i+1]/3600.,2)
         }
 
-    # Calculate last word (more than 6 hrs no message)
+    # Calculate last word (more than 6 hrs no message). Slice out the rows
+    # before/after each long gap at once, then group per user instead of
+    # updating dicts row by row
     last_msg_idx = np.argwhere(timing > 3600*6).flatten()
-    last = defaultdict(dict)
-    first = defaultdict(dict)
-    for i in last_msg_idx.tolist():
-        last[dfchat_sub.iloc[i]['user']]['count'] = last[dfchat_sub.iloc[i]['user']].get('count',0) + 1
-        last[dfchat_sub.iloc[i]['user']]['random'] = last[dfchat_sub.iloc[i]['user']].get('random',[]) + [dfchat_sub.iloc[i]['content']]
-
-        first[dfchat_sub.iloc[i+1]['user']]['count'] = first[dfchat_sub.iloc[i+1]['user']].get('count',0) + 1
-        first[dfchat_sub.iloc[i+1]['user']]['random'] = first[dfchat_sub.iloc[i+1]['user']].get('random',[]) + [dfchat_sub.iloc[i+1]['content']]
-
-    for k in last.keys():
-        last[k]['random'] = random.choice(last[k]['random'])
-    for k in first.keys():
-        first[k]['random'] = random.choice(first[k]['random'])
+    last_df = dfchat_sub.iloc[last_msg_idx]
+    first_df = dfchat_sub.iloc[last_msg_idx+1]
+    last = {u: {'count': len(g), 'random': random.choice(g.tolist())}
+        for u, g in last_df.groupby('user', observed=True)['content']}
+    first = {u: {'count': len(g), 'random': random.choice(g.tolist())}
+        for u, g in first_df.groupby('user', observed=True)['content']}
 
     return lonely, first, last
 
@@ -908,6 +906,10 @@ def calc_stats(dfchat, useraliases):
     Given normalized log format in chatparsed, calculate chat statistics.
     """
 
+    # Lowercase the content column once for all sub-calculators that need
+    # case-insensitive matching, instead of each doing its own full pass
+    dfchat = dfchat.assign(content_lc=dfchat['content'].str.lower())
+
     emoji = calc_stats_emoji(dfchat)
 
     monologues = calc_monologues(dfchat)
@@ -949,19 +951,27 @@ def store_stats(chatstats, chatstatsfile):
     pd.to_pickle(chatstats, chatstatsfile + ".pickle")
     #Could also work, might be the same: pickle.dump(chatstats, "dump2.pickle")
     import json
-    
+
     # Json serialization only works if we don't have DataFrame or NumPy stuff
-    # in our output. The below loop helps to debug which element might fail
-    # as it will raise an error locally.
+    # in our output. Serialize straight to file, converting stray NumPy
+    # scalars/arrays on the fly; only re-walk the dict per element for
+    # debugging if that fails, instead of probing with a full dumps up front.
+    def numpy_enc(o):
+        if (isinstance(o, np.integer)): return int(o)
+        if (isinstance(o, np.floating)): return float(o)
+        if (isinstance(o, np.ndarray)): return o.tolist()
+        raise TypeError("Object of type {} is not JSON serializable".format(type(o).__name__))
+
     try:
-        json.dumps(chatstats)
-    except:
+        with open(chatstatsfile + ".json", 'w') as fd:
+            json.dump(chatstats, fd, indent=1, default=numpy_enc)
+    except TypeError:
+        # The below loop helps to debug which element might fail as it will
+        # raise an error locally.
         for k0,v0 in chatstats.items():
             for k, v in v0.items():
-                json.dumps(v)
-
-    with open(chatstatsfile + ".json", 'w') as fd:
-        json.dump(chatstats, fd, indent=1)
+                json.dumps(v, default=numpy_enc)
+        raise
 
 def calc_stats_per_tf(dfchat, timeframes, useraliases):
     """
@@ -970,8 +980,21 @@ def calc_stats_per_tf(dfchat, timeframes, useraliases):
     dfchat should be a pandas dataframe with date as index.
     timeframes should be an iterable with time durations in days
     """
+    import hashlib
+    from concurrent.futures import ProcessPoolExecutor
+
     allstats = {}
-    last_tf_real = None
+    slices = {}
+    seen = set()
+
+    # Identical chat data and aliases give identical statistics, so cache
+    # results on disk keyed on a digest of both and skip recomputation on
+    # repeated runs over an unchanged chatlog
+    aliasrepr = repr(sorted(useraliases.items())) if useraliases else repr(useraliases)
+    digest = hashlib.blake2b(pd.util.hash_pandas_object(dfchat, index=True).to_numpy().tobytes()
+        + aliasrepr.encode()).hexdigest()[:16]
+    cachedir = '.pysg_cache'
+    os.makedirs(cachedir, exist_ok=True)
 
     # First convert -1 timeframe to 100 years.
     timeframes = list(timeframes)
@@ -985,12 +1008,32 @@ def calc_stats_per_tf(dfchat, timeframes, useraliases):
 
         # Calculate actual timespan we're parsing
         tf_real = (dfchatsub.index.max()  - dfchatsub.index.min()).days
-        # If we don't have more data for this timeframe, than the previous skip it
-        if (tf_real == last_tf_real): continue
 
-        # Calculate statistics, store thi
-        allstats[tf_real] = calc_stats(dfchatsub, useraliases)
-        last_tf_real = tf_real
+        # Dedup on the selected slice: overlapping timeframes often select
+        # the exact same data (e.g. 365d and all-time on a younger chat), no
+        # need to compute those twice
+        cachekey = (dfchatsub.index.min(), dfchatsub.index.max(), len(dfchatsub))
+        if (cachekey in seen): continue
+        seen.add(cachekey)
+
+        # Reuse cached statistics for this digest/timeframe if present
+        cachepath = os.path.join(cachedir, "{}_{}.pickle".format(digest, tf_real))
+        if (os.path.exists(cachepath)):
+            logging.debug("calc_stats_per_tf(): using cached stats %s", cachepath)
+            allstats[tf_real] = pd.read_pickle(cachepath)
+        else:
+            slices[tf_real] = dfchatsub
+
+    # Calculate statistics per timeframe; timeframes are independent, so
+    # fan them out over worker processes
+    if (slices):
+        with ProcessPoolExecutor(max_workers=len(slices)) as executor:
+            futures = {tf_real: executor.submit(calc_stats, dfchatsub, useraliases)
+                for tf_real, dfchatsub in slices.items()}
+            for tf_real, fut in futures.items():
+                allstats[tf_real] = fut.result()
+                pd.to_pickle(allstats[tf_real],
+                    os.path.join(cachedir, "{}_{}.pickle".format(digest, tf_real)))
 
     return allstats
 
@@ -1007,18 +1050,35 @@ def mk_html_report(allstats, outpath, template):
     """
     return
 
+def mk_topcounts_csv(counts, num=15):
+    """
+    Given a dict of {word: {user1: count1, userN: countN}}, make a CSV
+    string of the top-'num' words by total count with one column per user,
+    e.g. for the emoji and most-used-words tables.
+    """
+    # Let pandas do the word x user alignment in one construction instead
+    # of growing an object matrix per newly seen user, then keep the rows
+    # with the highest user-count totals
+    dfcounts = pd.DataFrame.from_dict(counts, orient='index').fillna(0).astype(int)
+    dfcounts = dfcounts.loc[dfcounts.sum(axis=1).nlargest(num).index]
+
+    csv = ",".join(['Word'] + list(dfcounts.columns))
+    for word, wcounts in zip(dfcounts.index, dfcounts.values):
+        csv += "\n" + ",".join([str(word)] + [str(c) for c in wcounts])
+    return csv
+
 def prep_render(s0):
     """
     Given dict of statistics, prep render for HTML output
     """
     render = {}
-    render['daily'] = ''
-    for k,v in s0['daily'].items():
-        render['daily'] += "{},{:.0f},{:.1f}\n".format(k,v['messages'], v['wordsperline'])
+    # Build CSV blocks by joining per-row strings, quadratic += growth on
+    # immutable strings gets slow for big outputs
+    render['daily'] = "".join("{},{:.0f},{:.1f}\n".format(k, v['messages'], v['wordsperline'])
+        for k, v in s0['daily'].items())
 
-    render['alltime'] = ''
-    for k,v in s0['alltime'].items():
-        render['alltime'] += "{},{:d},{:d},{:d},{:d}\n".format(k,v['00:00'], v['06:00'], v['12:00'], v['18:00'])
+    render['alltime'] = "".join("{},{:d},{:d},{:d},{:d}\n".format(k, v['00:00'], v['06:00'], v['12:00'], v['18:00'])
+        for k, v in s0['alltime'].items())
 
     render['totals'] = s0['totals']
     render['lonely'] = s0['lonely']
@@ -1039,74 +1099,28 @@ def prep_render(s0):
 
     ### MOST EMOJIS USED (same as most words)
 
-    # Build matrix containing: [word, countuser1, countuser2, countuser3, countuserN]
-    # Problem: list of words are different per user
-    emoji_mat = np.array([list(s0['emoji'].keys())],dtype=object).T
-    allusers = []
-    # Loop over all words, then loop over all users that mentioned this word, 
-    # store in big matrix. Each time we find a new user, expand matrix accordingly
-    for emoji, emojihits in s0['emoji'].items():
-        for user, count in emojihits.items():
-            if (not user in allusers):
-                allusers.append(user)
-                emoji_mat = np.hstack([emoji_mat, np.zeros((len(emoji_mat), 1),dtype=int)])
-            emoji_mat[emoji_mat[:,0] == emoji,allusers.index(user)+1] = count
-    
-    # Sort matrix, sum only user counts
-    emoji_mats = emoji_mat[emoji_mat[:,1:].sum(1).argsort()[::-1]][:15]
-
-    render['emoji'] = ",".join(['Word'] + allusers)
-    for words in emoji_mats:
-        render['emoji'] += "\n" + ','.join([str(i) for i in words])
+    render['emoji'] = mk_topcounts_csv(s0['emoji'])
 
     ### MOST WORDS USED
 
-    # Build matrix containing: [word, countuser1, countuser2, countuser3, countuserN]
-    # Problem: list of words are different per user
-    longmost_mat = np.array([list(s0['mostwords'].keys())],dtype=object).T
-    allusers = []
-    # Loop over all words, then loop over all users that mentioned this word, 
-    # store in big matrix. Each time we find a new user, expand matrix accordingly
-    for word, wordhits in s0['mostwords'].items():
-        for user, count in wordhits.items():
-            if (not user in allusers):
-                allusers.append(user)
-                longmost_mat = np.hstack([longmost_mat, np.zeros((len(longmost_mat), 1),dtype=int)])
-            longmost_mat[longmost_mat[:,0] == word,allusers.index(user)+1] = count
-    
-    # Sort matrix, sum only user counts
-    longmost_mats = longmost_mat[longmost_mat[:,1:].sum(1).argsort()[::-1]][:15]
-
-    render['mostwords'] = ",".join(['Word'] + allusers)
-    for words in longmost_mats:
-        render['mostwords'] += "\n" + ','.join([str(i) for i in words])
+    render['mostwords'] = mk_topcounts_csv(s0['mostwords'])
 
     ### CHAT TIMING -- only include totals, otherwise hard to see
     users = ['Everyone']
-    render['timing_chat'] = ''
+    timing_rows = []
     # Make header first from first round
     for k,v in s0['timing']['chat'].items():
-        render['timing_chat'] += "Delay"
-        for u,c in v.items():
-            if (u in users):
-                render['timing_chat'] += ",{}".format(u)
-        render['timing_chat'] += "\n"
+        timing_rows.append("Delay" + "".join(",{}".format(u) for u in v if u in users) + "\n")
         break
     # Now fill next lines with data
     for k,v in s0['timing']['chat'].items():
-        render['timing_chat'] += "{}".format(k)
-        for u,c in v.items():
-            if (u in users):
-                render['timing_chat'] += ",{}".format(c)
-        render['timing_chat'] += "\n"
+        timing_rows.append("{}".format(k) + "".join(",{}".format(c) for u,c in v.items() if u in users) + "\n")
+    render['timing_chat'] = "".join(timing_rows)
 
     ### SOCIAL NETWORK
-    render['network'] = ''
-    for from_user, v in s0['network']['network'].items():
-        for to_user, count in v.items():
-            render['network'] += "['{}','{}',{:d}],\n".format(from_user,to_user,count)
-    # TODO hack drop last comma
-    render['network'] = render['network'][:-2]
+    render['network'] = ",\n".join("['{}','{}',{:d}]".format(from_user, to_user, count)
+        for from_user, v in s0['network']['network'].items()
+        for to_user, count in v.items())
 
     return render
 
@@ -1195,6 +1209,15 @@ class TestSmileyMethods(unittest.TestCase):
             smileys[r] = smileys.get(r,0) + 1
         print(smileys)
 
+    def test_detect_fused(self):
+        # The parsing path scans each message once with the fused
+        # alternation; it should find everything the separate happy/sad
+        # patterns find
+        smiley_test_str = [":)", ":‑(", ":'‑)", "8D", ">:P", ":@", "😀", "😭", "bla :) 😢 bla :‑( end"]
+        for s in smiley_test_str:
+            separate = re_smiley_happy_all.findall(s) + re_smiley_sad_all.findall(s)
+            self.assertEqual(sorted(re_smiley_all.findall(s)), sorted(separate))
+
     def test_isupper(self):
         self.assertTrue('FOO'.isupper())
         self.assertFalse('Foo'.isupper())